@@ -1,19 +1,19 @@
 # -*- coding: utf-8 -*-
-from robyn import Request
-from typing import Optional
-from pydantic import BaseModel
+from robyn import Request, Response, Headers
 from pyfast.core import HTTPEndpoint
-from pyfast.core.cache import Cache, CacheTag
+import orjson
 
-
-class Test(BaseModel):
-    test1: Optional[str] = None
+# The liveness payload never changes, so serialize it once at import time.
+_BODY = orjson.dumps({"data": {"status": "ok"}, "errors": None, "error_code": None})
 
 
 class HealthCheck(HTTPEndpoint):
-    @Cache.cached(tag=CacheTag.GET_HEALTH_CHECK)
-    async def get(self, request: Request, query_params: Test) -> dict:
+    async def get(self, request: Request) -> Response:
         """
         Health Check
         """
-        return {"status": "ok"}
+        return Response(
+            description=_BODY,
+            headers=Headers({"Content-Type": "application/json", "Cache-Control": "no-store"}),
+            status_code=200,
+        )
@@ -12,6 +12,8 @@ class Config(BaseSettings):
     SENTRY_DSN: Optional[str] = None
     REDIS_URL: Optional[str] = None
     POSTGRES_URL: Optional[str] = None
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 1024
+    POSTGRES_PREPARED_STATEMENT_CACHE_SIZE: int = 512
     PREFIX_URL: str = "/"
     PORT: Optional[int] = Field(default=5005)
     ACCESS_TOKEN: str = ""
@@ -6,6 +6,9 @@ from .session import (
     get_session_context,
     set_session_context,
     reset_session_context,
+    get_lookup_cache,
+    set_lookup_cache,
+    reset_lookup_cache,
 )
 from .transaction import Transactional, Propagation
 from .repository import Model
@@ -18,6 +21,9 @@ __all__ = [
     "get_session_context",
     "set_session_context",
     "reset_session_context",
+    "get_lookup_cache",
+    "set_lookup_cache",
+    "reset_lookup_cache",
     "Transactional",
     "Propagation",
 ]
@@ -1,34 +1,154 @@
 # -*- coding: utf-8 -*-
-from functools import reduce
-from typing import Any, Generic, Optional, Type, TypeVar, Dict
-from sqlalchemy import Select, select, and_, desc, asc, between
+import asyncio
+from contextlib import asynccontextmanager
+import base64
+from collections.abc import Hashable
+from decimal import Decimal
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, AsyncIterator, Callable, ClassVar, Generic, Optional, Type, TypeVar, Dict
+from sqlalchemy import Insert, Row, Select, insert, inspect, select, update, and_, desc, asc, between
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import (
+    AsyncScalarResult,
     AsyncSession,
+    async_scoped_session,
 )
 from sqlalchemy.sql import func
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import DeclarativeBase, Session, joinedload, selectinload
 
-Base = declarative_base()
+from pyfast.core.logger import logger
+from .addons import PasswordType
+from .session import async_session_factory, get_lookup_cache
+import orjson
 
 
-class Model(Base):  # type: ignore
+class Base(DeclarativeBase):
+    pass
+
+
+def _json_default(value: Any) -> Any:
+    # orjson already handles datetime, date, time and UUID natively
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode("utf-8")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+# Column names and a matching attrgetter, computed once per (model class, exclude passwords).
+_as_dict_cache: Dict[tuple, tuple] = {}
+
+# Column attribute key -> mapped attribute, computed once per model class.
+_columns_cache: Dict[type, Dict[str, Any]] = {}
+
+
+class Model(Base):
     __abstract__ = True
     __table_args__ = {"extend_existing": True}
 
+    @classmethod
+    def _as_dict_columns(cls, exclude_passwords: bool = False) -> tuple:
+        key = (cls, exclude_passwords)
+        cached = _as_dict_cache.get(key)
+        if cached is None:
+            columns = cls.__table__.columns
+            if exclude_passwords:
+                columns = [c for c in columns if not isinstance(c.type, PasswordType)]
+            names = tuple(c.name for c in columns)
+            cached = _as_dict_cache[key] = (names, attrgetter(*names) if names else lambda _: ())
+        return cached
+
+    def _column_values(self, exclude_passwords: bool = False) -> Dict[str, Any]:
+        names, getter = self._as_dict_columns(exclude_passwords)
+        values = getter(self)
+        if len(names) == 1:
+            values = (values,)
+        return dict(zip(names, values))
+
     @property
     def as_dict(self) -> Dict[str, Any]:
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return self._column_values()
+
+    def as_json(self) -> bytes:
+        """
+        Returns the columns of the model serialized to JSON bytes.
+
+        Password columns are left out. Decimal values are encoded as
+        strings and binary values as base64.
+        """
+        return orjson.dumps(self._column_values(exclude_passwords=True), default=_json_default)
+
+
+ModelType = TypeVar("ModelType", bound=Base)
+
 
+def _is_range(value: Any) -> bool:
+    return isinstance(value, dict) and "$gt" in value and "$lt" in value
 
-ModelType = TypeVar("ModelType", bound=Base)  # type: ignore
+
+@lru_cache(maxsize=512)
+def _where_builder(model_class: type, keys: tuple, ranges: frozenset) -> Callable[[dict], Any]:
+    """
+    Returns a function building the WHERE clause for one shape of filters.
+
+    Columns and the equality / range branches are resolved once per
+    (model, keys, range keys), so a request only pays for the clause itself.
+
+    :param model_class: The model to filter.
+    :param keys: The filtered columns, in order.
+    :param ranges: The keys filtered with a {"$gt": ..., "$lt": ...} range.
+    :return: A function taking the where dict and returning the clause.
+    """
+    plan = tuple((key, getattr(model_class, key), key in ranges) for key in keys)
+
+    def build(where: dict) -> Any:
+        return and_(*(between(column, where[key]["$gt"], where[key]["$lt"]) if is_range else column == where[key] for key, column, is_range in plan))
+
+    return build
+
+
+def _join_callable(join: Any) -> Callable[[Any, Select], Select]:
+    """
+    Returns the join as a function taking (repository, query).
+
+    Static and class methods are bound through the descriptor protocol on each call,
+    plain functions are used as is.
+    """
+    if isinstance(join, (staticmethod, classmethod)):
+        return lambda repository, query: join.__get__(repository, type(repository))(query)
+    return join
+
+
+# Base SELECT statements keyed by (repository class, model, joins, eager loads).
+# Statements are immutable, so they can be shared and extended per call; SQLAlchemy
+# then hits its compiled cache because the statement cache key is unchanged.
+_query_cache: Dict[tuple, Select] = {}
 
 
 class PostgresRepository(Generic[ModelType]):
     """Base class for data repositories."""
 
+    # Join name -> function applying the join, e.g {"author": _join_author}.
+    # Every `_join_<name>` method of a subclass is registered automatically.
+    _JOIN_MAP: ClassVar[dict[str, Callable[[Any, Select], Select]]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        join_map = {}
+        for klass in reversed(cls.__mro__):
+            for name, attribute in vars(klass).items():
+                if name.startswith("_join_") and (callable(attribute) or isinstance(attribute, (staticmethod, classmethod))):
+                    join_map[name[len("_join_") :]] = _join_callable(attribute)
+            join_map.update({name: _join_callable(join) for name, join in vars(klass).get("_JOIN_MAP", {}).items()})
+        cls._JOIN_MAP = join_map
+
     def __init__(self, model: Type[ModelType], db_session: AsyncSession):
         self.session = db_session  # type: ignore
         self.model_class: Type[ModelType] = model
+        self._cols = _columns_cache.get(model)
+        if self._cols is None:
+            self._cols = _columns_cache[model] = {attr.key: getattr(model, attr.key) for attr in inspect(model).column_attrs}
 
     async def create(self, attributes: Optional[dict[str, Any]] = None) -> ModelType:
         """
@@ -43,6 +163,59 @@ class PostgresRepository(Generic[ModelType]):
         self.session.add(model)
         return model
 
+    async def bulk_create(
+        self,
+        rows: list[dict[str, Any]],
+        chunk_size: int = 1000,
+        skip_failed: bool = False,
+    ) -> list[ModelType]:
+        """
+        Creates many model instances with INSERT ... RETURNING statements.
+
+        The rows are sent `chunk_size` at a time to stay under the
+        PostgreSQL bind parameter limit. With `skip_failed`, every chunk
+        runs in its own SAVEPOINT. A chunk violating a constraint is rolled
+        back and retried row by row, so only the failing rows are skipped
+        (and logged) while the other rows and the outer transaction are kept.
+
+        :param rows: The attributes of each model to create.
+        :param chunk_size: The number of rows per statement.
+        :param skip_failed: Whether to skip the rows raising an IntegrityError.
+        :return: The created model instances, in the same order as the rows. With
+            `skip_failed`, skipped rows have no instance, so the list can be shorter
+            than the rows and `models[i]` no longer matches `rows[i]`.
+        """
+        statement = insert(self.model_class).returning(self.model_class, sort_by_parameter_order=True)
+        models: list[ModelType] = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size]
+            if not skip_failed:
+                result = await self.session.execute(statement, chunk)
+                models.extend(result.scalars())
+                continue
+
+            try:
+                models.extend(await self._insert_nested(statement, chunk))
+            except IntegrityError:
+                for index, row in enumerate(chunk, start):
+                    try:
+                        models.extend(await self._insert_nested(statement, [row]))
+                    except IntegrityError as exception:
+                        logger.warning(f"bulk_create skipped row {index} of {self.model_class.__name__}: {exception.orig}")
+        return models
+
+    async def _insert_nested(self, statement: Insert, rows: list[dict[str, Any]]) -> list[ModelType]:
+        """
+        Runs the INSERT statement for the rows inside a SAVEPOINT.
+
+        :param statement: The INSERT ... RETURNING statement.
+        :param rows: The attributes of each model to create.
+        :return: The created model instances.
+        """
+        async with self.session.begin_nested():
+            result = await self.session.execute(statement, rows)
+            return list(result.scalars())
+
     async def get_all(
         self,
         skip: int = 0,
@@ -50,6 +223,7 @@ class PostgresRepository(Generic[ModelType]):
         join_: set[str] | None = None,
         where: Optional[dict] = None,
         order_by: tuple[str, str] | None = None,
+        eager: dict[str, str] | None = None,
     ) -> list[ModelType]:
         """
         Returns a list of model instances.
@@ -58,37 +232,64 @@ class PostgresRepository(Generic[ModelType]):
         :param limit: The number of record to return.
         :param join_: The joins to make.
         :param where: The conditions for the WHERE clause.
+        :param eager: The relationships to eager load, mapped to their strategy (selectin, joined).
         :return: A list of model instances.
         """
-        query = self._query(join_)
+        query = self._query(join_, eager=eager)
         query = query.offset(skip).limit(limit)
 
         if where is not None:
-            conditions = []
-            for k, v in where.items():
-                if isinstance(v, dict) and "$gt" in v and "$lt" in v:
-                    conditions.append(between(getattr(self.model_class, k), v["$gt"], v["$lt"]))
-                else:
-                    conditions.append(getattr(self.model_class, k) == v)
-            query = query.where(and_(*conditions))
+            query = query.where(self._where(where))
 
         if order_by is not None:
             column, direction = order_by
             if direction.lower() == "desc":
-                query = query.order_by(desc(getattr(self.model_class, column)))
+                query = query.order_by(desc(self._column(column)))
             else:
-                query = query.order_by(asc(getattr(self.model_class, column)))
+                query = query.order_by(asc(self._column(column)))
 
-        if join_ is not None:
+        if join_ is not None or (eager and "joined" in eager.values()):
             return await self.all_unique(query)
         return await self._all(query)
 
+    async def project(
+        self,
+        columns: list[str],
+        skip: int = 0,
+        limit: int = 100,
+        where: Optional[dict] = None,
+        order_by: tuple[str, str] | None = None,
+    ) -> list[Row]:
+        """
+        Returns only the given columns, as rows instead of model instances.
+
+        :param columns: The columns to select.
+        :param skip: The number of records to skip.
+        :param limit: The number of record to return.
+        :param where: The conditions for the WHERE clause.
+        :param order_by: The column and direction (asc, desc) to order by.
+        :return: A list of rows holding the selected columns.
+        """
+        query = select(*(self._column(column) for column in columns))
+        query = query.offset(skip).limit(limit)
+
+        if where is not None:
+            query = query.where(self._where(where))
+
+        if order_by is not None:
+            column, direction = order_by
+            query = await self._sort_by(query, column, direction.lower())
+
+        result = await self.session.execute(query)
+        return result.all()
+
     async def get_by(
         self,
         field: str,
         value: Any,
         join_: set[str] | None = None,
         unique: bool = False,
+        eager: dict[str, str] | None = None,
     ) -> ModelType | list[ModelType] | None:
         """
         Returns the model instance matching the field and value.
@@ -96,18 +297,64 @@ class PostgresRepository(Generic[ModelType]):
         :param field: The field to match.
         :param value: The value to match.
         :param join_: The joins to make.
+        :param eager: The relationships to eager load, mapped to their strategy (selectin, joined).
         :return: The model instance.
+
+        Unique lookups without joins are cached for the current request.
         """
-        query = self._query(join_)
+        cache = get_lookup_cache() if unique and join_ is None and not eager and isinstance(value, Hashable) else None
+        if cache is not None:
+            key = (self.model_class, field, type(value), value)
+            cached = cache.get(key)
+            if cached is not None:
+                state = inspect(cached)
+                # The instance may belong to another session or have been changed since it was cached
+                if state.session is self._sync_session() and not state.expired_attributes and getattr(cached, field) == value:
+                    return cached
+                del cache[key]
+
+        query = self._query(join_, eager=eager)
         query = await self._get_by(query, field, value)
 
-        if join_ is not None:
+        if join_ is not None or (eager and "joined" in eager.values()):
+            if unique:
+                return await self._one_unique(query)
             return await self.all_unique(query)
         if unique:
-            return await self._one(query)
+            model = await self._one(query)
+            if cache is not None:
+                cache[key] = model
+            return model
 
         return await self._all(query)
 
+    async def fetch_many(
+        self,
+        specs: list[tuple[str, Any]],
+        unique: bool = False,
+    ) -> list[ModelType | list[ModelType]]:
+        """
+        Runs several independent lookups concurrently.
+
+        An AsyncSession does not allow concurrent operations, so every lookup
+        runs on its own short-lived session (and pooled connection).
+        The returned instances are not attached to the current session.
+
+        :param specs: The (field, value) pairs to match.
+        :param unique: Whether each lookup returns a single instance.
+        :return: The results, in the same order as the specs.
+        """
+
+        async def _fetch(field: str, value: Any) -> ModelType | list[ModelType]:
+            async with async_session_factory() as session:
+                query = await self._get_by(self._query(), field, value)
+                result = await session.scalars(query)
+                if unique:
+                    return result.one()
+                return result.all()
+
+        return list(await asyncio.gather(*(_fetch(field, value) for field, value in specs)))
+
     async def delete(self, model: ModelType) -> None:
         """
         Deletes the model.
@@ -115,42 +362,120 @@ class PostgresRepository(Generic[ModelType]):
         :param model: The model to delete.
         :return: None
         """
+        self._evict(model)
         await self.session.delete(model)
 
-    async def update(self, model: ModelType, attributes: dict[str, Any]) -> ModelType:
+    async def update(self, model: ModelType, attributes: dict[str, Any], flush: bool = False) -> ModelType:
         """
         Updates the model.
 
+        The changes are committed by the surrounding Transactional scope.
+        Only column attributes are set, other keys are ignored.
+
         :param model: The model to update.
         :param attributes: The attributes to update the model with.
+        :param flush: Whether to flush now, so database generated values are loaded on the model.
         :return: The updated model instance.
         """
-        for key, value in attributes.items():
-            if hasattr(model, key):
-                setattr(model, key, value)
+        self._evict(model)
+        for key in attributes.keys() & self._cols.keys():
+            setattr(model, key, attributes[key])
 
         self.session.add(model)
-        await self.session.commit()
+        if flush:
+            await self.session.flush()
 
         return model
 
+    async def bulk_update(self, rows: list[dict[str, Any]]) -> None:
+        """
+        Updates many records in a single executemany statement.
+
+        Each row must contain the primary key of the record to update
+        along with the columns to change.
+
+        :param rows: The list of attributes to update, keyed by column.
+        :return: None
+        """
+        if not rows:
+            return
+
+        self._evict()
+        await self.session.execute(update(self.model_class), rows)
+
+    def _sync_session(self) -> Session:
+        """
+        Returns the sync Session behind the repository session (scoped or not).
+        """
+        session = self.session() if isinstance(self.session, async_scoped_session) else self.session
+        return session.sync_session
+
+    def _evict(self, model: ModelType | None = None) -> None:
+        """
+        Removes entries from the request lookup cache.
+
+        :param model: The instance to evict, or None to evict every instance of the model class.
+        """
+        cache = get_lookup_cache()
+        if not cache:
+            return
+
+        for key in [key for key, cached in cache.items() if (cached is model if model is not None else key[0] is self.model_class)]:
+            del cache[key]
+
+    def _column(self, name: str) -> Any:
+        """
+        Returns the mapped attribute of the model for the given name.
+
+        Columns come from the per-model cache; other attributes
+        (e.g hybrid properties) fall back to getattr.
+
+        :param name: The attribute name.
+        :return: The mapped attribute.
+        """
+        try:
+            return self._cols[name]
+        except KeyError:
+            return getattr(self.model_class, name)
+
+    def _where(self, where: dict) -> Any:
+        """
+        Returns the WHERE clause for the given conditions.
+
+        :param where: The conditions, either a value or a {"$gt": ..., "$lt": ...} range per column.
+        :return: The clause to pass to Select.where.
+        """
+        ranges = frozenset(k for k, v in where.items() if _is_range(v))
+        return _where_builder(self.model_class, tuple(where), ranges)(where)
+
     def _query(
         self,
         join_: set[str] | None = None,
         order_: dict | None = None,
+        eager: dict[str, str] | None = None,
     ) -> Select:
         """
         Returns a callable that can be used to query the model.
 
         :param join_: The joins to make.
         :param order_: The order of the results. (e.g desc, asc)
+        :param eager: The relationships to eager load, mapped to their strategy (selectin, joined).
         :return: A callable that can be used to query the model.
         """
-        query = select(self.model_class)
-        query = self._maybe_join(query, join_)
-        query = self._maybe_ordered(query, order_)
-
-        return query
+        key = (
+            type(self),
+            self.model_class,
+            frozenset(join_ or ()),
+            frozenset((eager or {}).items()),
+        )
+        query = _query_cache.get(key)
+        if query is None:
+            query = select(self.model_class)
+            query = self._maybe_join(query, join_)
+            query = self._maybe_eager_load(query, eager)
+            _query_cache[key] = query
+
+        return self._maybe_ordered(query, order_)
 
     async def _all(self, query: Select) -> list[ModelType]:
         """
@@ -162,10 +487,42 @@ class PostgresRepository(Generic[ModelType]):
         query = await self.session.scalars(query)
         return query.all()
 
+    @asynccontextmanager
+    async def stream(self, query: Select, chunk: int = 1000) -> AsyncIterator[AsyncScalarResult[ModelType]]:
+        """
+        Iterates the results from the query without loading them all in memory.
+
+        Rows are fetched from a server side cursor, `chunk` rows at a time.
+        The cursor is closed when the block exits, even on an early break::
+
+            async with repository.stream(query) as models:
+                async for model in models:
+                    ...
+
+        :param query: The query to execute.
+        :param chunk: The number of rows to fetch per round trip.
+        :return: An async context manager yielding the async iterable of model instances.
+        """
+        result = await self.session.stream_scalars(query.execution_options(yield_per=chunk))
+        try:
+            yield result
+        finally:
+            await result.close()
+
     async def all_unique(self, query: Select) -> list[ModelType]:
         result = await self.session.execute(query)
         return result.unique().scalars().all()
 
+    async def _one_unique(self, query: Select) -> ModelType:
+        """
+        Returns the single result from a query with joins or joined eager loads.
+
+        :param query: The query to execute.
+        :return: The model instance.
+        """
+        result = await self.session.execute(query)
+        return result.unique().scalars().one()
+
     async def _first(self, query: Select) -> ModelType | None:
         """
         Returns the first result from the query.
@@ -193,13 +550,20 @@ class PostgresRepository(Generic[ModelType]):
 
     async def _count(self, query: Select) -> int:
         """
-        Returns the count of the records.
+        Returns the count of the records matching the query.
+
+        The ORDER BY, LIMIT and OFFSET of the query are ignored. The projection
+        is replaced by count(*) so no subquery is needed, except for DISTINCT,
+        GROUP BY and HAVING queries, which are counted over a subquery.
 
         :param query: The query to execute.
         """
-        query = query.subquery()
-        query = await self.session.scalars(select(func.count()).select_from(query))
-        return query.one()
+        query = query.order_by(None).limit(None).offset(None)
+        if query._distinct or query._group_by_clauses or query._having_criteria:
+            return await self.session.scalar(select(func.count()).select_from(query.subquery()))
+
+        query = query.with_only_columns(func.count(), maintain_column_froms=True)
+        return await self.session.scalar(query)
 
     async def _sort_by(
         self,
@@ -219,14 +583,10 @@ class PostgresRepository(Generic[ModelType]):
         :param case_insensitive: Whether to sort case insensitively.
         :return: The sorted query.
         """
-        model = model or self.model_class
-
-        order_column = None
+        order_column = getattr(model, sort_by) if model is not None else self._column(sort_by)
 
         if case_insensitive:
-            order_column = func.lower(getattr(model, sort_by))
-        else:
-            order_column = getattr(model, sort_by)
+            order_column = func.lower(order_column)
 
         if order == "desc":
             return query.order_by(order_column.desc())
@@ -242,7 +602,7 @@ class PostgresRepository(Generic[ModelType]):
         :param value: The value to filter by.
         :return: The filtered query.
         """
-        return query.where(getattr(self.model_class, field) == value)
+        return query.where(self._column(field) == value)
 
     def _maybe_join(self, query: Select, join_: set[str] | None = None) -> Select:
         """
@@ -255,10 +615,9 @@ class PostgresRepository(Generic[ModelType]):
         if not join_:
             return query
 
-        if not isinstance(join_, set):
-            raise TypeError("join_ must be a set")
-
-        return reduce(self._add_join_to_query, join_, query)  # type: ignore
+        for name in join_:
+            query = self._JOIN_MAP[name](self, query)
+        return query
 
     def _maybe_ordered(self, query: Select, order_: dict | None = None) -> Select:
         """
@@ -271,19 +630,35 @@ class PostgresRepository(Generic[ModelType]):
         if order_:
             if order_["asc"]:
                 for order in order_["asc"]:
-                    query = query.order_by(getattr(self.model_class, order).asc())
+                    query = query.order_by(self._column(order).asc())
             else:
                 for order in order_["desc"]:
-                    query = query.order_by(getattr(self.model_class, order).desc())
+                    query = query.order_by(self._column(order).desc())
 
         return query
 
-    def _add_join_to_query(self, query: Select, join_: str) -> Select:
+    def _maybe_eager_load(self, query: Select, eager: dict[str, str] | None = None) -> Select:
         """
-        Returns the query with the given join.
+        Returns the query with the given relationships eager loaded.
 
-        :param query: The query to join.
-        :param join_: The join to make.
-        :return: The query with the given join.
+        Use "selectin" for collections (one extra SELECT ... IN per relationship)
+        and "joined" for single-valued relationships (LEFT OUTER JOIN).
+
+        :param query: The query to load the relationships for.
+        :param eager: The relationships to load, mapped to their strategy.
+        :return: The query with the loader options applied.
         """
-        return getattr(self, "_join_" + join_)(query)
+        if not eager:
+            return query
+
+        options = []
+        for relationship, strategy in eager.items():
+            attribute = getattr(self.model_class, relationship)
+            if strategy == "selectin":
+                options.append(selectinload(attribute))
+            elif strategy == "joined":
+                options.append(joinedload(attribute))
+            else:
+                raise ValueError(f"Unknown eager loading strategy: {strategy}")
+
+        return query.options(*options)
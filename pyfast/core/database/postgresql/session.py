@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from contextvars import ContextVar, Token
-from typing import Union
+from typing import Any, Optional, Union
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_scoped_session,
@@ -11,6 +12,7 @@ from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.sql.expression import Delete, Insert, Update
 from contextlib import asynccontextmanager
 from pyfast.config import config
+import orjson
 
 session_context: ContextVar[str] = ContextVar("session_context")
 
@@ -27,9 +29,66 @@ def reset_session_context(context: Token) -> None:
     session_context.reset(context)
 
 
+# Request scoped cache of unique lookups: (model class, field, type(value), value) -> instance.
+lookup_cache_context: ContextVar[dict] = ContextVar("lookup_cache_context")
+
+
+def get_lookup_cache() -> Optional[dict[tuple, Any]]:
+    return lookup_cache_context.get(None)
+
+
+def set_lookup_cache(cache: dict[tuple, Any]) -> Token:
+    return lookup_cache_context.set(cache)
+
+
+def reset_lookup_cache(context: Token) -> None:
+    lookup_cache_context.reset(context)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _clear_lookup_cache(session: Session, previous_transaction) -> None:
+    # A rollback expires the cached instances, reading them would need a lazy load
+    cache = get_lookup_cache()
+    if cache:
+        cache.clear()
+
+
+def _asyncpg_url(url: str) -> str:
+    """
+    Force the asyncpg driver on a PostgreSQL URL.
+
+    :param url: The database URL (e.g postgresql://, postgresql+psycopg://).
+    :return: The URL using the postgresql+asyncpg:// scheme.
+    """
+    scheme, sep, rest = url.partition("://")
+    if sep and scheme.split("+")[0] in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+def _json_serializer(value) -> str:
+    return orjson.dumps(value).decode("utf-8")
+
+
+def _create_engine():
+    return create_async_engine(
+        _asyncpg_url(config.POSTGRES_URL),
+        pool_recycle=360,
+        pool_size=50,
+        max_overflow=10,
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads,
+        connect_args={
+            # asyncpg's own statement cache and SQLAlchemy's prepared statement cache (per connection)
+            "statement_cache_size": config.POSTGRES_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": config.POSTGRES_PREPARED_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
 engines = {
-    "writer": create_async_engine(config.POSTGRES_URL, pool_recycle=360, pool_size=50, max_overflow=10),
-    "reader": create_async_engine(config.POSTGRES_URL, pool_recycle=360, pool_size=50, max_overflow=10),
+    "writer": _create_engine(),
+    "reader": _create_engine(),
 }
 
 
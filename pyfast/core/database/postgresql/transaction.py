@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from contextvars import ContextVar
 from enum import Enum
 from functools import wraps
 import traceback
@@ -6,10 +7,14 @@ from typing import Any
 
 from pyfast.core.database.postgresql import session_scope
 
+# Whether a REQUIRED / REQUIRED_NEW scope is running, so NESTED can use a savepoint in it.
+transaction_context: ContextVar[bool] = ContextVar("transaction_context", default=False)
+
 
 class Propagation(Enum):
     REQUIRED = "required"
     REQUIRED_NEW = "required_new"
+    NESTED = "nested"
 
 
 class Transactional:
@@ -19,6 +24,15 @@ class Transactional:
     def __call__(self, function) -> Any:  # type: ignore
         @wraps(function)
         async def decorator(*args, **kwargs):
+            if self.propagation == Propagation.NESTED and transaction_context.get():
+                # The savepoint is rolled back on error, the outer transaction is kept.
+                # Without an outer Transactional scope nothing would commit it, so run as REQUIRED.
+                return await self._run_nested(
+                    function=function,
+                    args=args,
+                    kwargs=kwargs,
+                )
+
             try:
                 if self.propagation == Propagation.REQUIRED:
                     result = await self._run_required(
@@ -48,12 +62,25 @@ class Transactional:
         return decorator  # type: ignore
 
     async def _run_required(self, function, args, kwargs) -> None:
-        result = await function(*args, **kwargs)
+        context = transaction_context.set(True)
+        try:
+            result = await function(*args, **kwargs)
+        finally:
+            transaction_context.reset(context)
         await session_scope.commit()
         return result
 
     async def _run_required_new(self, function, args, kwargs) -> None:
         session_scope.begin()
-        result = await function(*args, **kwargs)
+        context = transaction_context.set(True)
+        try:
+            result = await function(*args, **kwargs)
+        finally:
+            transaction_context.reset(context)
         await session_scope.commit()
         return result
+
+    async def _run_nested(self, function, args, kwargs) -> Any:
+        async with session_scope.begin_nested():
+            result = await function(*args, **kwargs)
+        return result
@@ -3,8 +3,10 @@ from uuid import uuid4
 
 from starlette.types import ASGIApp, Receive, Scope, Send
 from pyfast.core.database.postgresql import (
+    reset_lookup_cache,
     reset_session_context,
     session_scope,
+    set_lookup_cache,
     set_session_context,
 )
 
@@ -16,6 +18,7 @@ class SQLAlchemyMiddleware:
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         session_id = str(uuid4())
         context = set_session_context(session_id=session_id)
+        cache_context = set_lookup_cache({})
 
         try:
             await self.app(scope, receive, send)
@@ -23,4 +26,5 @@ class SQLAlchemyMiddleware:
             raise exception
         finally:
             await session_scope.remove()
+            reset_lookup_cache(context=cache_context)
             reset_session_context(context=context)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from pyfast.core.database.postgresql import Model
+from pyfast.core.database.postgresql.addons.password import Password
 from pyfast.core.database.postgresql.addons import (
     PasswordType,
     DatetimeType,
@@ -7,8 +8,11 @@ from pyfast.core.database.postgresql.addons import (
     LargeBinaryEncryptType,
     AESEngine,
 )
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
 from cryptography.hazmat.primitives.padding import PKCS7
+from datetime import datetime
+from typing import Optional
 import os
 
 aes_engine = AESEngine(secret_key=os.urandom(32), iv=os.urandom(16), padding_class=PKCS7)
@@ -17,12 +21,12 @@ aes_engine = AESEngine(secret_key=os.urandom(32), iv=os.urandom(16), padding_cla
 class User(Model):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
-    password = Column(PasswordType(max_length=1024, schemes=("bcrypt",)))
-    date_of_birth = Column(DatetimeType)
-    encrypt_1 = Column(StringEncryptType(engine=aes_engine))
-    encrypt_2 = Column(LargeBinaryEncryptType(engine=aes_engine))
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[Optional[str]] = mapped_column(String)
+    password: Mapped[Optional[Password]] = mapped_column(PasswordType(max_length=1024, schemes=("bcrypt",)))
+    date_of_birth: Mapped[Optional[datetime]] = mapped_column(DatetimeType)
+    encrypt_1: Mapped[Optional[str]] = mapped_column(StringEncryptType(engine=aes_engine))
+    encrypt_2: Mapped[Optional[bytes]] = mapped_column(LargeBinaryEncryptType(engine=aes_engine))
 
     def __repr__(self):
         return f"<Test {self.name}>"
@@ -0,0 +1,10 @@
+import pytest
+from tests.utils import get
+
+
+@pytest.mark.benchmark
+def test_health_check(session):
+    res = get("/health_check")
+    assert res.status_code == 200
+    assert res.json() == {"data": {"status": "ok"}, "errors": None, "error_code": None}
+    assert res.headers.get("cache-control") == "no-store"
@@ -0,0 +1,415 @@
+import asyncio
+import os
+from datetime import datetime
+
+import orjson
+import pytest
+
+os.environ.setdefault("POSTGRES_URL", "sqlite+aiosqlite:///pyfast-test.db")
+
+from sqlalchemy import ForeignKey, String, event, func, select  # noqa: E402
+from sqlalchemy.exc import NoResultFound  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Mapped, mapped_column, relationship  # noqa: E402
+
+from pyfast.core.database.postgresql import (  # noqa: E402
+    Model,
+    Propagation,
+    PostgresRepository,
+    Transactional,
+    reset_lookup_cache,
+    reset_session_context,
+    session_scope,
+    set_lookup_cache,
+    set_session_context,
+)
+from pyfast.core.database.postgresql.session import engines  # noqa: E402
+from pyfast.models import User  # noqa: E402
+
+
+class Item(Model):
+    __tablename__ = "test_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, unique=True)
+    price: Mapped[int] = mapped_column(default=0)
+
+
+class Parent(Model):
+    __tablename__ = "test_parents"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String)
+    children: Mapped[list["Child"]] = relationship(back_populates="parent")
+
+
+class Child(Model):
+    __tablename__ = "test_children"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    parent_id: Mapped[int] = mapped_column(ForeignKey("test_parents.id"))
+    parent: Mapped[Parent] = relationship(back_populates="children")
+
+
+def run(test, model: type = Item) -> None:
+    """
+    Runs the test coroutine with a repository bound to an in-memory database.
+    """
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as connection:
+            await connection.run_sync(Model.metadata.create_all, tables=[Item.__table__, Parent.__table__, Child.__table__])
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                await test(PostgresRepository(model, session))
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def record_queries(repository: PostgresRepository) -> list:
+    """
+    Returns a list receiving every SQL statement run by the repository session.
+    """
+    statements: list = []
+    event.listen(repository.session.bind.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_bulk_create():
+    async def check(repository: PostgresRepository):
+        rows = [{"name": f"item-{i}", "price": i} for i in range(5)]
+        items = await repository.bulk_create(rows, chunk_size=2)
+        assert [item.name for item in items] == [row["name"] for row in rows]
+        assert all(item.id is not None for item in items)
+        assert await repository._count(select(Item)) == 5
+
+    run(check)
+
+
+def test_bulk_update():
+    async def check(repository: PostgresRepository):
+        items = await repository.bulk_create([{"name": "a", "price": 1}, {"name": "b", "price": 2}])
+        await repository.bulk_update([{"id": item.id, "price": item.price * 10} for item in items])
+        rows = await repository.project(["name", "price"], order_by=("name", "asc"))
+        assert [tuple(row) for row in rows] == [("a", 10), ("b", 20)]
+
+    run(check)
+
+
+def test_count_ignores_order_and_pagination():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": f"item-{i}", "price": i % 2} for i in range(6)])
+        query = select(Item).where(Item.price == 1).order_by(Item.name).offset(1).limit(1)
+        assert await repository._count(query) == 3
+
+    run(check)
+
+
+def test_count_distinct_and_group_by():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": f"item-{i}", "price": price} for i, price in enumerate([1, 1, 1, 2])])
+        assert await repository._count(select(Item.price).distinct()) == 2
+        assert await repository._count(select(Item.price).group_by(Item.price)) == 2
+        assert await repository._count(select(Item.price).group_by(Item.price).having(func.count() > 1)) == 1
+
+    run(check)
+
+
+def test_project():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": f"item-{i}", "price": i} for i in range(5)])
+        rows = await repository.project(["name"], skip=1, limit=2, where={"price": {"$gt": 0, "$lt": 4}}, order_by=("price", "desc"))
+        assert [tuple(row) for row in rows] == [("item-3",), ("item-2",)]
+
+    run(check)
+
+
+def test_stream():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": f"item-{i}"} for i in range(5)])
+        async with repository.stream(select(Item).order_by(Item.id), chunk=2) as items:
+            names = [item.name async for item in items]
+        assert names == [f"item-{i}" for i in range(5)]
+
+        async with repository.stream(select(Item).order_by(Item.id), chunk=2) as items:
+            async for item in items:
+                break
+        assert items.closed
+
+    run(check)
+
+
+def test_bulk_create_skip_failed_keeps_valid_rows():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": "p0"}])
+        rows = [{"name": "x1"}, {"name": "p0"}, {"name": "x2"}, {"name": "x3"}]
+        items = await repository.bulk_create(rows, chunk_size=2, skip_failed=True)
+        assert [item.name for item in items] == ["x1", "x2", "x3"]
+        assert await repository._count(select(Item)) == 4
+
+    run(check)
+
+
+def test_as_json_leaves_out_passwords():
+    user = User(id=1, name="john", password="secret", date_of_birth=datetime(2000, 1, 2), encrypt_1="text", encrypt_2=b"bytes")
+    assert orjson.loads(user.as_json()) == {
+        "id": 1,
+        "name": "john",
+        "date_of_birth": "2000-01-02T00:00:00",
+        "encrypt_1": "text",
+        "encrypt_2": "Ynl0ZXM=",
+    }
+
+
+def test_get_by_unique_is_cached_for_the_request():
+    async def check(repository: PostgresRepository):
+        item = (await repository.bulk_create([{"name": "a", "price": 1}]))[0]
+        context = set_lookup_cache({})
+        try:
+            statements = record_queries(repository)
+            assert await repository.get_by("name", "a", unique=True) is item
+            assert await repository.get_by("name", "a", unique=True) is item
+            assert len(statements) == 1
+
+            # True == 1 but they are different lookups
+            assert (await repository.get_by("price", 1, unique=True)) is item
+            assert await repository.get_by("price", True, unique=True) is item
+            assert len(statements) == 3
+        finally:
+            reset_lookup_cache(context)
+
+    run(check)
+
+
+def test_get_by_unique_cache_is_evicted_on_update():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": "a"}])
+        context = set_lookup_cache({})
+        try:
+            item = await repository.get_by("name", "a", unique=True)
+            await repository.update(item, {"name": "b"}, flush=True)
+            statements = record_queries(repository)
+            assert await repository.get_by("name", "b", unique=True) is item
+            assert len(statements) == 1
+            with pytest.raises(NoResultFound):
+                await repository.get_by("name", "a", unique=True)
+        finally:
+            reset_lookup_cache(context)
+
+    run(check)
+
+
+def test_get_by_unique_cache_skips_changed_instances():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": "a"}])
+        context = set_lookup_cache({})
+        try:
+            item = await repository.get_by("name", "a", unique=True)
+            item.name = "b"
+            await repository.session.flush()
+            with pytest.raises(NoResultFound):
+                await repository.get_by("name", "a", unique=True)
+        finally:
+            reset_lookup_cache(context)
+
+    run(check)
+
+
+def test_get_by_unique_cache_is_per_session():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": "a"}])
+        await repository.session.commit()
+        context = set_lookup_cache({})
+        try:
+            item = await repository.get_by("name", "a", unique=True)
+            async with AsyncSession(repository.session.bind, expire_on_commit=False) as session:
+                other = await PostgresRepository(Item, session).get_by("name", "a", unique=True)
+                assert other is not item
+                assert other in session
+        finally:
+            reset_lookup_cache(context)
+
+    run(check)
+
+
+def test_get_by_unique_cache_is_cleared_on_rollback():
+    async def check(repository: PostgresRepository):
+        await repository.bulk_create([{"name": "a"}])
+        await repository.session.commit()
+        context = set_lookup_cache({})
+        try:
+            item = await repository.get_by("name", "a", unique=True)
+            await repository.session.rollback()
+            item = await repository.get_by("name", "a", unique=True)
+            assert item.name == "a"
+        finally:
+            reset_lookup_cache(context)
+
+    run(check)
+
+
+async def add_parents(repository: PostgresRepository) -> None:
+    repository.session.add_all([Parent(name=f"parent-{i}", children=[Child(), Child()]) for i in range(3)])
+    await repository.session.commit()
+    repository.session.expunge_all()
+
+
+def test_get_all_selectin_eager_load():
+    async def check(repository: PostgresRepository):
+        await add_parents(repository)
+        statements = record_queries(repository)
+        parents = await repository.get_all(eager={"children": "selectin"})
+        assert [len(parent.children) for parent in parents] == [2, 2, 2]
+        assert len(statements) == 2
+
+    run(check, Parent)
+
+
+def test_get_all_joined_eager_load():
+    async def check(repository: PostgresRepository):
+        await add_parents(repository)
+        statements = record_queries(repository)
+        parents = await repository.get_all(eager={"children": "joined"})
+        assert [len(parent.children) for parent in parents] == [2, 2, 2]
+        assert len(statements) == 1
+
+    run(check, Parent)
+
+
+def test_get_by_unique_joined_eager_load_returns_one_instance():
+    async def check(repository: PostgresRepository):
+        await add_parents(repository)
+        statements = record_queries(repository)
+        parent = await repository.get_by("name", "parent-1", unique=True, eager={"children": "joined"})
+        assert isinstance(parent, Parent)
+        assert len(parent.children) == 2
+        assert len(statements) == 1
+
+    run(check, Parent)
+
+
+def test_unknown_eager_strategy():
+    async def check(repository: PostgresRepository):
+        with pytest.raises(ValueError):
+            await repository.get_all(eager={"children": "lazy"})
+
+    run(check, Parent)
+
+
+class ParentRepository(PostgresRepository[Parent]):
+    def _join_children(self, query):
+        return query.join(Parent.children)
+
+    @staticmethod
+    def _join_first(query):
+        return query.where(Parent.name == "parent-0")
+
+    @classmethod
+    def _join_last(cls, query):
+        return query.where(Parent.name == "parent-2")
+
+
+class OtherParentRepository(PostgresRepository[Parent]):
+    def _join_first(self, query):
+        return query.where(Parent.name == "parent-1")
+
+
+def test_joins_resolve_through_join_map():
+    async def check(repository: PostgresRepository):
+        await add_parents(repository)
+        parents = ParentRepository(Parent, repository.session)
+        assert set(ParentRepository._JOIN_MAP) == {"children", "first", "last"}
+        assert len(await parents.get_all(join_={"children"})) == 3
+        assert [parent.name for parent in await parents.get_all(join_={"first"})] == ["parent-0"]
+        assert [parent.name for parent in await parents.get_all(join_={"last"})] == ["parent-2"]
+
+        # The cached base query is per repository class, not only per model and joins
+        others = OtherParentRepository(Parent, repository.session)
+        assert [parent.name for parent in await others.get_all(join_={"first"})] == ["parent-1"]
+
+    run(check, Parent)
+
+
+def run_transactional(test, monkeypatch) -> None:
+    """
+    Runs the test coroutine with session_scope bound to an in-memory database.
+    """
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+
+        # Let SQLAlchemy emit BEGIN itself, pysqlite's implicit transactions break SAVEPOINT
+        @event.listens_for(engine.sync_engine, "connect")
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def begin(connection):
+            connection.exec_driver_sql("BEGIN")
+
+        async with engine.begin() as connection:
+            await connection.run_sync(Model.metadata.create_all, tables=[Item.__table__])
+        monkeypatch.setitem(engines, "writer", engine)
+        monkeypatch.setitem(engines, "reader", engine)
+        context = set_session_context("test")
+        try:
+            await test()
+        finally:
+            await session_scope.remove()
+            reset_session_context(context)
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+@Transactional(propagation=Propagation.NESTED)
+async def add_item_nested(name: str, fail: bool = False) -> None:
+    session_scope.add(Item(name=name))
+    await session_scope.flush()
+    if fail:
+        raise ValueError(name)
+
+
+@Transactional()
+async def add_items(fail: bool = False) -> None:
+    await add_item_nested("a")
+    with pytest.raises(ValueError):
+        await add_item_nested("b", fail=True)
+    await add_item_nested("c")
+    if fail:
+        raise RuntimeError("outer failure")
+
+
+async def item_names() -> list[str]:
+    return list(await session_scope.scalars(select(Item.name).order_by(Item.name)))
+
+
+def test_nested_failure_keeps_outer_work(monkeypatch):
+    async def check():
+        await add_items()
+        await session_scope.remove()
+        assert await item_names() == ["a", "c"]
+
+    run_transactional(check, monkeypatch)
+
+
+def test_outer_failure_rolls_back_nested_work(monkeypatch):
+    async def check():
+        with pytest.raises(RuntimeError):
+            await add_items(fail=True)
+        await session_scope.remove()
+        assert await item_names() == []
+
+    run_transactional(check, monkeypatch)
+
+
+def test_nested_without_outer_scope_commits(monkeypatch):
+    async def check():
+        await add_item_nested("a")
+        await session_scope.remove()
+        assert await item_names() == ["a"]
+
+    run_transactional(check, monkeypatch)